@@ -0,0 +1,60 @@
+# -*- coding:utf-8 -*-
+"""
+Main-thread time per tile with and without the decode stage.
+
+It measures the time spent by the tcl interpreter in `image create photo`
+for encoded PNG/JPEG tiles and for tiles preprocessed by `bio.decode`. Data
+is passed as bytes, as tile workers do, so tcl gets a byte array. It needs
+`PIL` and a display.
+
+    python bench/decode.py [count]
+"""
+
+import io
+import sys
+import time
+import random
+import tkinter
+
+from tkmap import bio, load_img_package
+from PIL import Image
+
+
+def sample(fmt: str, seed: int) -> bytes:
+    rnd = random.Random(seed)
+    image = Image.new("RGB", (256, 256), (170, 211, 223))
+    for i in range(300):
+        x, y = rnd.randrange(256), rnd.randrange(256)
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        image.paste(color, (x, y, min(256, x+16), min(256, y+4)))
+    out = io.BytesIO()
+    image.save(out, fmt)
+    return out.getvalue()
+
+
+def measure(tk: tkinter.Tk, tiles: list) -> float:
+    t = time.perf_counter()
+    for i, data in enumerate(tiles):
+        tk.tk.call(
+            "image", "create", "photo", f"bench_{i}",
+            "-data", data
+        )
+    elapsed = time.perf_counter() - t
+    tk.tk.eval(
+        "image delete " + " ".join(f"bench_{i}" for i in range(len(tiles)))
+    )
+    return elapsed / len(tiles) * 1000
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    tk = tkinter.Tk()
+    load_img_package(tk.tk)
+    for fmt in ["PNG", "JPEG"]:
+        tiles = [sample(fmt, i) for i in range(count)]
+        decoded = [bio.decode(data) for data in tiles]
+        print(
+            f"{fmt:>4}: {measure(tk, tiles):.3f} ms/tile encoded, "
+            f"{measure(tk, decoded):.3f} ms/tile decoded"
+        )
+    tk.destroy()
@@ -0,0 +1,103 @@
+# -*- coding:utf-8 -*-
+"""
+Python to Tcl traffic during a simulated drag.
+
+It counts tcl calls made by a `Tkmap` widget while it receives motion
+events at about 250Hz, with motion coalescing disabled (`inputrate=0`) and
+enabled (default `inputrate=60`). It needs a display, tile requests are sent
+to an unreachable url and fail silently.
+
+    python bench/drag.py [count]
+"""
+
+import os
+import sys
+import time
+import logging
+import tkinter
+
+from tkmap import JSON, MAPS, bio, model, widget
+
+NAME = "_bench"
+
+
+class Counter:
+    "Proxy of tkapp object counting calls to tcl interpreter."
+
+    def __init__(self, tk) -> None:
+        self._tk = tk
+        self.calls = 0
+
+    def __getattr__(self, name: str):
+        return getattr(self._tk, name)
+
+    def call(self, *args):
+        self.calls += 1
+        return self._tk.call(*args)
+
+    def eval(self, *args):
+        self.calls += 1
+        return self._tk.eval(*args)
+
+    def setvar(self, *args):
+        self.calls += 1
+        return self._tk.setvar(*args)
+
+
+class Event:
+
+    def __init__(self, x: int, y: int) -> None:
+        self.x, self.y = x, y
+
+
+def drag(
+    root: tkinter.Tk, mapmodel: model.MapModel, count: int, **kw
+) -> tuple:
+    canvas = widget.Tkmap(root, width=800, height=600, **kw)
+    canvas.pack(fill="both", expand=True)
+    canvas.open(mapmodel, zoom=12, location=[48.645272, 1.841411])
+    root.update()
+    counter = Counter(canvas.tk)
+    canvas.tk = counter
+    canvas.on_button_1(Event(400, 300))
+    t = time.perf_counter()
+    for i in range(count):
+        canvas.on_motion(Event(400 + i % 200, 300 + i % 100))
+        canvas.on_button_1_motion(Event(400 - i % 200, 300 - i % 100))
+        time.sleep(0.004)
+        root.update()
+    canvas.on_button_1_release(Event(200, 200))
+    elapsed = time.perf_counter() - t
+    calls = counter.calls
+    canvas.tk = counter._tk
+    canvas.destroy()
+    return calls, elapsed
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    logging.getLogger().setLevel(logging.CRITICAL)
+    mapmodel = model.MapModel()
+    mapmodel.name = NAME
+    mapmodel.urls = ["http://127.0.0.1:9/{zoom}/{col}/{row}.png"]
+    # widget saves its location on close, user location is restored after
+    location = os.path.join(JSON, ".loc")
+    saved = open(location).read() if os.path.exists(location) else None
+    root = tkinter.Tk()
+    try:
+        for rate in [0, 60]:
+            calls, elapsed = drag(root, mapmodel, count, inputrate=rate)
+            print(
+                f"inputrate={rate:>2}: {calls} tcl calls for {count} motion "
+                f"event pairs ({calls/count:.2f} per pair) in {elapsed:.2f}s"
+            )
+    finally:
+        root.destroy()
+        if saved is not None:
+            with open(location, "w") as out:
+                out.write(saved)
+        time.sleep(0.5)
+        for ext in ["", "-wal", "-shm"]:
+            path = os.path.join(MAPS, NAME + ".sqlm" + ext)
+            if os.path.exists(path) and not len(bio.TileService.SERVICES):
+                os.remove(path)
@@ -0,0 +1,101 @@
+# -*- coding:utf-8 -*-
+"""
+Map model startup and per-tile url generation benchmark.
+
+It compares json loading with and without model registry and tile url
+generation with `str.format(**model.__dict__)` against compiled templates.
+
+    python bench/model.py [count]
+
+Quadkey generation is measured apart, against the previous string
+concatenation loop.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+
+from tkmap import JSON, model
+
+NAME = "_bench"
+DEFINITION = {
+    "name": NAME,
+    "urls": [
+        "https://{s}.tile.example.org/{zoom}/{col}/{row}.png?key={key}",
+        "https://{s}.tile.example.org/{zoom}/{col}/{row}.jpg?key={key}",
+    ],
+    "s": "a",
+    "key": "0123456789abcdef",
+}
+
+
+def legacy_url(mapmodel: model.MapModel, row: int, col: int, zoom: int):
+    return random.choice(mapmodel.urls).format(
+        zoom=zoom, col=col, row=row, **mapmodel.__dict__
+    ), mapmodel.headers()
+
+
+def legacy_q(row: int, col: int, zoom: int) -> str:
+    q = "" if zoom != 0 else "0"
+    for i in range(zoom, 0, -1):
+        digit, mask = 0, 1 << (i-1)
+        if (col & mask) != 0:
+            digit += 1
+        if (row & mask) != 0:
+            digit += 2
+        q += str(digit)
+    return q
+
+
+def timeit(func, count: int) -> float:
+    t = time.perf_counter()
+    for i in range(count):
+        func()
+    return (time.perf_counter() - t) / count * 1e6
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = os.path.join(JSON, NAME + ".json")
+    with open(path, "w") as out:
+        json.dump(DEFINITION, out)
+    try:
+        model.REGISTRY.clear()
+        first = timeit(lambda: model.MapModel.load(NAME), 1)
+        cached = timeit(lambda: model.MapModel.load(NAME), 1000)
+        print(f"load: {first:.1f} us first, {cached:.3f} us registered")
+    finally:
+        os.remove(path)
+
+    mapmodel = model.MapModel.load(NAME)
+    tiles = [
+        (random.randrange(2**17), random.randrange(2**17), 17)
+        for i in range(count)
+    ]
+    t = time.perf_counter()
+    for row, col, zoom in tiles:
+        legacy_url(mapmodel, row, col, zoom)
+    legacy = (time.perf_counter() - t) / count * 1e6
+    t = time.perf_counter()
+    for row, col, zoom in tiles:
+        mapmodel.get_tile_url(row, col, zoom)
+    compiled = (time.perf_counter() - t) / count * 1e6
+    t = time.perf_counter()
+    mapmodel.get_tile_urls(tiles)
+    batch = (time.perf_counter() - t) / count * 1e6
+    print(
+        f"url: {legacy:.3f} us/tile legacy, {compiled:.3f} us/tile compiled, "
+        f"{batch:.3f} us/tile batch"
+    )
+
+    t = time.perf_counter()
+    for row, col, zoom in tiles:
+        legacy_q(row, col, zoom)
+    legacy = (time.perf_counter() - t) / count * 1e6
+    t = time.perf_counter()
+    for row, col, zoom in tiles:
+        mapmodel.Q(row, col, zoom)
+    chunked = (time.perf_counter() - t) / count * 1e6
+    print(f"quadkey: {legacy:.3f} us/tile legacy, {chunked:.3f} us/tile")
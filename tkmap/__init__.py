@@ -16,8 +16,13 @@ def load_img_package(tk):
     It tries to load tke `imgtk` tcl package to add JPEG codec to the tcl
     interpreter. It logs an error if `imgtk` package not found. To install
     it locally you can extract the `imgtk` package folder in a `.tcl` folder
-    at the root of `tkmap` package (ie containing the `__init__.py`).
+    at the root of `tkmap` package (ie containing the `__init__.py`). Loading
+    is attempted only once per tcl interpreter, it is flagged by the
+    `::tkmap_img` global variable of the interpreter.
     """
+    if tk.call("info", "exists", "::tkmap_img"):
+        return
+    tk.call("set", "::tkmap_img", 1)
     img_path = os.path.normpath(
         os.path.join(HOME, ".tcl")
     ).replace(os.sep, "/")
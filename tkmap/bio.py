@@ -3,18 +3,28 @@
 Basic input/output module.
 """
 
+import io
 import os
 import ssl
+import time
+import atexit
+import weakref
+import pathlib
 import queue
 import base64
+import hashlib
 import sqlite3
 import logging
 import threading
+import multiprocessing
 
 from urllib.request import Request, OpenerDirector, HTTPHandler
 from urllib.request import HTTPSHandler
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from tkmap import MAPS
-from typing import Union
+from typing import List, Tuple, Union
 
 try:
     import sqlitemap
@@ -23,13 +33,73 @@ try:
 except Exception:
     SQLITEMAP = False
 
+try:
+    from PIL import Image
+    PILLOW = True
+except Exception:
+    PILLOW = False
+
+
+class NoCoverage(Exception):
+    "Raised when tile server has no tile at requested location."
+
+
+def decode(data: bytes) -> bytes:
+    """
+    Decode PNG or JPEG data into binary PPM (or PGM for grayscale images) so
+    tk photo image only has to copy pixels. Images with transparency are
+    returned untouched because PPM has no alpha channel.
+
+    Args:
+        data (bytes): encoded image data.
+
+    Returns:
+        bytes: raw pixel image data.
+    """
+    image = Image.open(io.BytesIO(data))
+    if "transparency" in image.info or (
+        image.mode in ("RGBA", "LA") and
+        image.getchannel("A").getextrema()[0] < 255
+    ):
+        return data
+    image = image.convert("L" if image.mode in ("1", "L", "LA") else "RGB")
+    out = io.BytesIO()
+    image.save(out, "PPM")
+    return out.getvalue()
+
+
+def composite(layers: List[bytes]) -> bytes:
+    """
+    Stack image layers into a single PNG image. First layer is the base,
+    next ones are alpha-composited over it in order.
+
+    Args:
+        layers (List[bytes]): encoded image data.
+
+    Returns:
+        bytes: PNG image data.
+    """
+    if not PILLOW:
+        raise Exception("PIL is required to composite tile layers")
+    base = Image.open(io.BytesIO(layers[0])).convert("RGBA")
+    for data in layers[1:]:
+        layer = Image.open(io.BytesIO(data)).convert("RGBA")
+        if layer.size != base.size:
+            layer = layer.resize(base.size)
+        base.alpha_composite(layer)
+    out = io.BytesIO()
+    base.save(out, "PNG")
+    return out.getvalue()
+
 
 class TileWorker(threading.Thread):
     """
     Tile downloader daemon. It gets data from sqlite database or from url
     request if not found. It works with two LIFO queues. `TileWorker` is a
     subclass of `threading.Thread`, it is set as a `daemon` on initialization
-    and starts immediately.
+    and starts immediately. Results are pushed as `[tag, data, key]` where
+    `data` is image data as bytes, so tkinter passes it to tcl as a byte
+    array, and `key` is the content hash of tile data.
 
     Attributes:
         timeout (int): (class attribute) timeout delay when tile data is
@@ -37,14 +107,27 @@ class TileWorker(threading.Thread):
         opener (urllib.request.OpenerDirector): (class attribute) url opener
             used by all `TileWorker` intances. It is set only with the first
             class instanciation.
+        decoder (concurrent.futures.ProcessPoolExecutor): (class attribute)
+            process pool used by `"process"` decode stage.
+        fetcher (concurrent.futures.ThreadPoolExecutor): (class attribute)
+            thread pool used to download tile layers in parallel.
         job (queue.Queue): queue from where tile tag and map model.
         result (queue.Queue): queue where tile tag and data are pushed into.
+            Any object with a `put` method, such as `TileService`, can be
+            used.
         db_name (str): database base name.
+        database (Database): database shared with other workers. If `None`,
+            the worker opens its own database.
+        decode (str): decode stage mode, `"thread"` to decode tiles in the
+            worker thread, `"process"` to decode tiles in a pool of worker
+            processes or `None` to send encoded tiles.
         stop (threading.Event): event used to stop forever loop.
     """
 
     timeout = 5
     opener = None
+    decoder = None
+    fetcher = None
 
     def __init__(
         self, job: queue.Queue, result: queue.Queue, db_name: str, **options
@@ -55,6 +138,8 @@ class TileWorker(threading.Thread):
             result (queue.Queue): queue where tile tag and data are pushed
                 into.
             db_name (str): database base name.
+            **options: `exc_info` to log traceback, `database` to share a
+                `Database` instance and `decode` to enable decode stage.
         """
         threading.Thread.__init__(self)
         self.job = job
@@ -70,8 +155,22 @@ class TileWorker(threading.Thread):
             TileWorker.opener = OpenerDirector()
             TileWorker.opener.add_handler(HTTPHandler())
             TileWorker.opener.add_handler(HTTPSHandler(context=ctx))
+            TileWorker.fetcher = ThreadPoolExecutor()
 
         self.exc_info = options.get("exc_info", False)
+        self.database = options.get("database", None)
+        self.decode = options.get("decode", None) if PILLOW else None
+        if options.get("decode", None) and not PILLOW:
+            logging.error(
+                f" -> {__class__.__name__}: PIL not found - "
+                "decode stage disabled"
+            )
+        # process pool is created once and shared by all workers, spawn
+        # context avoids forking a process running tcl interpreter
+        if self.decode == "process" and TileWorker.decoder is None:
+            TileWorker.decoder = ProcessPoolExecutor(
+                mp_context=multiprocessing.get_context("spawn")
+            )
         self.start()
 
     def kill(self) -> None:
@@ -80,9 +179,10 @@ class TileWorker(threading.Thread):
 
     def run(self) -> None:
         "Forever loop"
-        db = (Database if not SQLITEMAP else sqlitemap.SqliteMapFile)(
-            self.db_name
-        )
+        db = self.database or \
+            (Database if not SQLITEMAP else sqlitemap.SqliteMapFile)(
+                self.db_name
+            )
         while True:
             try:
                 # tag is a formated string "{zoom}_{row}_{col}"
@@ -91,26 +191,98 @@ class TileWorker(threading.Thread):
                 if tag is None:
                     break
                 zoom, row, col = [int(e) for e in tag.split("_")]
-                data = db.get(zoom, row, col)  # False if not found
+                # data is False if not found, content hash is read from
+                # database when available
+                if isinstance(db, Database):
+                    data, key = db.get_tile(zoom, row, col)
+                else:
+                    data, key = db.get(zoom, row, col), None
                 if not data:
-                    # download tile using model information
-                    url, headers = model.get_tile_url(row, col, zoom)
-                    logging.debug(f" -> {__class__.__name__}: {url}")
-                    data = self.get(url, headers)
-                    db.put(zoom, row, col, data)
-                # sends tag and data to the result queue
-                self.result.put(
-                    [tag, base64.b64decode(data).decode("utf-8")]
-                )
+                    data = self.fetch(model, row, col, zoom)
+                    key = db.put(zoom, row, col, data)
+                key = key or Database.digest(data)
+                data = base64.b64decode(data).decode("utf-8").encode("latin-1")
+                if self.decode == "thread":
+                    data = decode(data)
+                elif self.decode == "process":
+                    data = self.decode_in_process(data)
+                # sends tag, data and content hash to the result queue
+                self.result.put([tag, data, key])
             except Exception as error:
-                self.result.put([tag, False])
+                self.result.put([tag, False, None])
                 logging.error(
                     f" -> {__class__.__name__}: {error}",
                     exc_info=self.exc_info
                 )
-        db.close()
+        # shared database is closed by its owner
+        if db is not self.database:
+            db.close()
         logging.info(f" -> {__class__.__name__}: {self} exiting")
 
+    def decode_in_process(self, data: bytes) -> bytes:
+        """
+        Decode tile in the process pool. If the pool does not answer within
+        `timeout` delay or is broken (ie spawned processes re-running a
+        script without `if __name__ == "__main__":` guard), the undecoded
+        tile is returned and the decode stage is disabled for this worker.
+
+        Args:
+            data (bytes): encoded image data.
+
+        Returns:
+            bytes: decoded image data.
+        """
+        future = TileWorker.decoder.submit(decode, data)
+        try:
+            return future.result(timeout=TileWorker.timeout)
+        except (FutureTimeoutError, BrokenProcessPool):
+            future.cancel()
+            self.decode = None
+            logging.error(
+                f" -> {__class__.__name__}: decode process pool not "
+                "usable - decode stage disabled"
+            )
+            return data
+
+    def fetch(self, model, row: int, col: int, zoom: int) -> str:
+        """
+        Download tile using model information. If model defines `layers`,
+        all layer tiles are downloaded in parallel and composited into one
+        image.
+
+        Args:
+            model (model.MapModel): map model used to get tile url.
+            row (int): tile set row.
+            col (int): tile set column.
+            zoom (int): tile set zoom level.
+
+        Returns:
+            str: base64-encoded data.
+        """
+        layers = getattr(model, "layers", None)
+        if layers is None:
+            url, headers = model.get_tile_url(row, col, zoom)
+            logging.debug(f" -> {__class__.__name__}: {url}")
+            return self.get(url, headers)
+        futures = [
+            TileWorker.fetcher.submit(self.fetch, layer, row, col, zoom)
+            for layer in layers
+        ]
+        datas = [futures[0].result()]
+        # overlay tiles out of coverage are skipped, any other error is
+        # raised so the partial composite is not cached
+        for future in futures[1:]:
+            try:
+                datas.append(future.result())
+            except NoCoverage as error:
+                logging.info(f" -> {__class__.__name__}: {error}")
+        return base64.b64encode(
+            composite(
+                [base64.b64decode(data).decode("utf-8").encode("latin-1")
+                 for data in datas]
+            ).decode("latin-1").encode("utf-8")
+        ).decode("utf-8")
+
     def get(self, url: str, headers: dict = {}) -> str:
         """Download tile from server.
 
@@ -128,36 +300,403 @@ class TileWorker(threading.Thread):
                 res.headers.get_content_charset("latin-1")
             )
             return base64.b64encode(data.encode("utf-8")).decode("utf-8")
+        elif res.status in (204, 404):
+            raise NoCoverage(f"no tile {res.status} - {url}")
         else:
             raise Exception(f"error {res.status} - {res.reason}")
 
 
-class Database:
+class TileService:
     """
-    `sqlite3` database implementation used for tile caching.
+    Process-wide tile service shared by all widgets using the same map model.
+    It owns one pool of `TileWorker` and one deduplicated request table: a
+    tile requested by several subscribers is fetched once and the result is
+    delivered to every subscriber queue waiting for it. Services are keyed by
+    map model name and are created on first subscription and stopped when
+    the last subscriber leaves.
+
+    Attributes:
+        SERVICES (dict): (class attribute) running services by model name.
+        LOCK (threading.Lock): (class attribute) lock protecting `SERVICES`.
+        size (int): (class attribute) number of workers started by service.
+        name (str): map model name used as database base name.
+        database (Database): database shared by the workers, `None` if
+            `sqlitemap` is used.
+        job (queue.LifoQueue): queue shared by the workers.
+        pending (dict): subscriber queues waiting for a tile by tag.
+        subscribers (set): subscribed result queues.
+        workers (List[TileWorker]): worker pool.
     """
 
+    SERVICES = {}
     LOCK = threading.Lock()
+    size = 2
+
+    def __init__(self, name: str, **options) -> None:
+        """
+        Args:
+            name (str): map model name used as database base name.
+            **options: keyword arguments forwarded to `TileWorker`.
+        """
+        self.name = name
+        self.job = queue.LifoQueue()
+        self.pending = {}
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        size = options.pop("size", TileService.size)
+        self.database = Database(name) if not SQLITEMAP else None
+        self.workers = [
+            TileWorker(self.job, self, name, database=self.database, **options)
+            for i in range(size)
+        ]
+
+    @staticmethod
+    def subscribe(name: str, result: queue.Queue, **options) -> "TileService":
+        """
+        Subscribe a result queue to the service of a map model, the service
+        is started if needed.
+
+        Args:
+            name (str): map model name.
+            result (queue.Queue): queue where tile tag and data are pushed
+                into.
+            **options: keyword arguments used if service is started.
+
+        Returns:
+            TileService: the service associated to the map model name.
+        """
+        with TileService.LOCK:
+            service = TileService.SERVICES.get(name, None)
+            if service is None:
+                service = TileService(name, **options)
+                TileService.SERVICES[name] = service
+            with service.lock:
+                service.subscribers.add(result)
+        return service
+
+    def unsubscribe(self, result: queue.Queue) -> None:
+        """
+        Remove a result queue from the service. Workers are stopped when no
+        more subscribers remain.
+
+        Args:
+            result (queue.Queue): queue previously subscribed.
+        """
+        self.cancel(result)
+        with TileService.LOCK:
+            with self.lock:
+                self.subscribers.discard(result)
+                if len(self.subscribers):
+                    return
+            if TileService.SERVICES.get(self.name, None) is self:
+                TileService.SERVICES.pop(self.name)
+        # workers may be downloading so database is closed once they end
+        threading.Thread(target=self._shutdown, daemon=True).start()
+
+    def _shutdown(self) -> None:
+        workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.kill()
+        for worker in workers:
+            worker.join()
+        if self.database is not None:
+            self.database.close()
+
+    def request(self, tag: str, model, result: queue.Queue) -> None:
+        """
+        Ask for a tile. The job is queued only if no other subscriber is
+        already waiting for the same tile.
+
+        Args:
+            tag (str): tile tag with format `{zoom}_{row}_{col}`.
+            model (model.MapModel): map model used to get tile url.
+            result (queue.Queue): queue where tile tag and data are pushed
+                into.
+        """
+        with self.lock:
+            waiting = self.pending.get(tag, None)
+            if waiting is None:
+                self.pending[tag] = set([result])
+                self.job.put([tag, model])
+            else:
+                waiting.add(result)
+
+    def cancel(self, result: queue.Queue) -> None:
+        """
+        Forget all requests made by a subscriber. Jobs no more expected by
+        any subscriber are removed from job queue.
 
-    def __init__(self, name: str) -> None:
+        Args:
+            result (queue.Queue): queue previously subscribed.
+        """
+        with self.lock:
+            for tag, waiting in list(self.pending.items()):
+                waiting.discard(result)
+                if not len(waiting):
+                    self.pending.pop(tag)
+            with self.job.mutex:
+                self.job.queue[:] = [
+                    job for job in self.job.queue
+                    if job[0] is None or job[0] in self.pending
+                ]
+
+    def preload(
+        self, zoom: int, row1: int, col1: int, row2: int, col2: int
+    ) -> List[list]:
+        """
+        Read tiles of a rectangular area from database in one query and
+        prepare them as worker results, decode stage included. Tiles not in
+        database or failing to decode are ignored, workers will fetch them.
+        Decoding is given one `TileWorker.timeout` delay for the whole area,
+        if the decode pool does not answer in time remaining tiles are
+        returned undecoded.
+
+        Args:
+            zoom (int): tile set zoom level.
+            row1 (int): first tile set row.
+            col1 (int): first tile set column.
+            row2 (int): last tile set row.
+            col2 (int): last tile set column.
+
+        Returns:
+            List[list]: tile tag, data and content hash.
+        """
+        if self.database is None:
+            return []
+        tiles = self.database.get_area(zoom, row1, col1, row2, col2)
+        tags = [f"{zoom}_{row}_{col}" for row, col in tiles.keys()]
+        keys = [key for data, key in tiles.values()]
+        datas = [
+            base64.b64decode(data).decode("utf-8").encode("latin-1")
+            for data, key in tiles.values()
+        ]
+        mode = self.workers[0].decode if len(self.workers) else None
+        pool = {
+            "process": TileWorker.decoder, "thread": TileWorker.fetcher
+        }.get(mode, None)
+        futures = [pool.submit(decode, data) for data in datas] \
+            if pool is not None else []
+        deadline = time.monotonic() + TileWorker.timeout
+        results = []
+        for i, (tag, data, key) in enumerate(zip(tags, datas, keys)):
+            if len(futures):
+                try:
+                    data = futures[i].result(
+                        timeout=max(0., deadline - time.monotonic())
+                    )
+                except (FutureTimeoutError, BrokenProcessPool):
+                    for future in futures[i:]:
+                        future.cancel()
+                    futures = []
+                    logging.error(
+                        f" -> {__class__.__name__}: decode pool not usable "
+                        "- tiles preloaded undecoded"
+                    )
+                except Exception as error:
+                    logging.error(
+                        f" -> {__class__.__name__}: {error} - tag {tag}"
+                    )
+                    continue
+            results.append([tag, data, key])
+        return results
+
+    def put(self, item: list) -> None:
+        """
+        Dispatch a worker result to every subscriber waiting for it. This
+        makes `TileService` usable as a `TileWorker` result queue.
+
+        Args:
+            item (list): tile tag, data and content hash.
+        """
+        with self.lock:
+            waiting = self.pending.pop(item[0], ())
+        for result in waiting:
+            result.put(item)
+
+
+class Database:
+    """
+    `sqlite3` database implementation used for tile caching. Tile bodies are
+    stored once by content hash in `blobs` table and `tilemap` table links
+    `(zoom, row, col)` to the hash, so identical tiles (ocean, blank land...)
+    share the same record. Bodies no more linked to any tile after a
+    replacement are deleted.
+
+    Reads are served by a pool of read-only connections so they scale with
+    the number of workers, all writes are sent to a single writer thread
+    owning the only read-write connection. Database runs in WAL mode so
+    readers are never blocked by the writer. Databases still open at
+    interpreter exit are closed so queued writes are flushed. SQL requests
+    are constant class attributes, so each connection prepares them once
+    and reuses them from the `sqlite3` statement cache.
+
+    Attributes:
+        OPENED (weakref.WeakSet): (class attribute) databases not closed.
+        PRAGMAS (tuple): (class attribute) pragmas applied to every
+            connection.
+        SQL_GET (str): (class attribute) tile query.
+        SQL_GET_AREA (str): (class attribute) tile area query.
+        SQL_GET_HASH (str): (class attribute) tile content hash query.
+        SQL_PUT_BLOB (str): (class attribute) tile body insertion.
+        SQL_PUT_TILE (str): (class attribute) tile location insertion.
+        SQL_DEL_BLOB (str): (class attribute) unlinked tile body deletion.
+        pool_size (int): (class attribute) number of read-only connections.
+        path (str): database file path.
+        pending (dict): tiles queued for writing as
+            `[zoom, row, col, hash, data]`, by `(zoom, row, col)`.
+        readers (queue.Queue): read-only connection pool.
+        writes (queue.Queue): queue consumed by writer thread.
+        writer (threading.Thread): writer thread.
+    """
+
+    OPENED = weakref.WeakSet()
+    PRAGMAS = (
+        "PRAGMA synchronous=NORMAL;",
+        "PRAGMA mmap_size=268435456;",
+        "PRAGMA cache_size=-16384;",
+        "PRAGMA temp_store=MEMORY;",
+    )
+    SQL_GET = \
+        "SELECT hash, data FROM tilemap JOIN blobs USING(hash) " \
+        "WHERE zoom=? AND row=? AND col=?;"
+    SQL_GET_AREA = \
+        "SELECT row, col, hash, data FROM tilemap JOIN blobs USING(hash) " \
+        "WHERE zoom=? AND row BETWEEN ? AND ? AND col BETWEEN ? AND ?;"
+    SQL_GET_HASH = "SELECT hash FROM tilemap WHERE zoom=? AND row=? AND col=?;"
+    SQL_PUT_BLOB = "INSERT OR IGNORE INTO blobs(hash, data) VALUES(?,?);"
+    SQL_PUT_TILE = \
+        "INSERT OR REPLACE INTO tilemap(zoom, row, col, hash) VALUES(?,?,?,?);"
+    SQL_DEL_BLOB = \
+        "DELETE FROM blobs WHERE hash=? AND NOT EXISTS " \
+        "(SELECT 1 FROM tilemap WHERE hash=?);"
+    pool_size = 4
+
+    def __init__(self, name: str, pool_size: int = None) -> None:
         """
         Args:
             name (str): database name. Database is created in the tkmap.MAPS
             folder with ".sqlm" extention.
+            pool_size (int): number of read-only connections. Class attribute
+                value is used if not provided.
         """
-
-        sqlite = sqlite3.connect(os.path.join(MAPS, name + ".sqlm"))
-        sqlite.row_factory = sqlite3.Row
+        self.path = os.path.join(MAPS, name + ".sqlm")
+        sqlite = self._connect()
+        sqlite.execute("PRAGMA journal_mode=WAL;")
+        sqlite.create_function("digest", 1, Database.digest)
+        sqlite.execute(
+            "CREATE TABLE IF NOT EXISTS blobs(hash TEXT PRIMARY KEY, "
+            "data TEXT);"
+        )
         sqlite.execute(
-            "CREATE TABLE IF NOT EXISTS tiles(zoom INTEGER, "
-            "row INTEGER, col INTEGER, data TEXT);"
+            "CREATE TABLE IF NOT EXISTS tilemap(zoom INTEGER, "
+            "row INTEGER, col INTEGER, hash TEXT);"
         )
         sqlite.execute(
-            "CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON "
-            "tiles(zoom, row, col);"
+            "CREATE UNIQUE INDEX IF NOT EXISTS tilemap_index ON "
+            "tilemap(zoom, row, col);"
         )
+        # migrate tiles from previous `tiles(zoom, row, col, data)` schema
+        if sqlite.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND "
+            "name='tiles';"
+        ).fetchall():
+            sqlite.execute(
+                "INSERT OR IGNORE INTO blobs(hash, data) "
+                "SELECT digest(data), data FROM tiles;"
+            )
+            sqlite.execute(
+                "INSERT OR REPLACE INTO tilemap(zoom, row, col, hash) "
+                "SELECT zoom, row, col, digest(data) FROM tiles;"
+            )
+            sqlite.execute("DROP TABLE tiles;")
         sqlite.commit()
-        self.sqlite = sqlite
+
+        self.pending = {}
+        self.readers = queue.Queue()
+        for i in range(pool_size or Database.pool_size):
+            self.readers.put(self._connect(readonly=True))
+        self.writes = queue.Queue()
+        self.writer = threading.Thread(
+            target=self._write_loop, args=(sqlite,), daemon=True
+        )
+        self.writer.start()
+        Database.OPENED.add(self)
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        # path is percent-encoded so `#`, `?` or `%` are not parsed as uri
+        # delimiters
+        sqlite = sqlite3.connect(
+            pathlib.Path(self.path).resolve().as_uri() +
+            f"?mode={'ro' if readonly else 'rwc'}",
+            uri=True, check_same_thread=False
+        )
+        sqlite.row_factory = sqlite3.Row
+        for pragma in Database.PRAGMAS:
+            sqlite.execute(pragma)
+        return sqlite
+
+    def _write_loop(self, sqlite: sqlite3.Connection) -> None:
+        while True:
+            item = self.writes.get()
+            # writes queued meanwhile are grouped in the same transaction
+            batch = [item]
+            while item is not None:
+                try:
+                    item = self.writes.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            # only the last write of a tile is kept
+            tiles = list(dict(
+                ((e[0], e[1], e[2]), e) for e in batch if e is not None
+            ).values())
+            try:
+                with sqlite:
+                    # hashes of replaced tiles, their bodies are deleted once
+                    # no tile links to them
+                    replaced = set()
+                    for zoom, row, col, key, data in tiles:
+                        old = sqlite.execute(
+                            Database.SQL_GET_HASH, (zoom, row, col)
+                        ).fetchone()
+                        if old is not None and old["hash"] != key:
+                            replaced.add(old["hash"])
+                    sqlite.executemany(
+                        Database.SQL_PUT_BLOB,
+                        [(key, data) for zoom, row, col, key, data in tiles]
+                    )
+                    sqlite.executemany(
+                        Database.SQL_PUT_TILE,
+                        [(zoom, row, col, key)
+                         for zoom, row, col, key, data in tiles]
+                    )
+                    sqlite.executemany(
+                        Database.SQL_DEL_BLOB, [(h, h) for h in replaced]
+                    )
+            except sqlite3.Error as error:
+                logging.error(f" -> {__class__.__name__}: {error}")
+            # a tile put again meanwhile stays pending until its own write
+            for tile in tiles:
+                if self.pending.get(tuple(tile[:3]), None) is tile:
+                    self.pending.pop(tuple(tile[:3]), None)
+            if item is None:
+                break
+        sqlite.close()
+
+    @staticmethod
+    def digest(data: str) -> str:
+        """
+        Compute tile content hash.
+
+        Args:
+            data (str): base64-encoded string.
+
+        Returns:
+            str: hexadecimal hash.
+        """
+        return hashlib.blake2b(
+            data.encode("utf-8"), digest_size=16
+        ).hexdigest()
 
     def get(self, zoom: int, row: int, col: int) -> Union[str, bool]:
         """
@@ -171,34 +710,105 @@ class Database:
         Returns:
             str|bool: base64-encoded data if any tile found else `False`
         """
+        return self.get_tile(zoom, row, col)[0]
+
+    def get_tile(
+        self, zoom: int, row: int, col: int
+    ) -> Tuple[Union[str, bool], str]:
+        """
+        Get a tile and its stored content hash from database using row,
+        column and zoom parameters.
+
+        Args:
+            zoom (int): tile set zoom level.
+            row (int): tile set row.
+            col (int): tile set column.
+
+        Returns:
+            Tuple[str|bool, str]: base64-encoded data and content hash if
+                any tile found else `False` and `None`.
+        """
+        item = self.pending.get((zoom, row, col), None)
+        if item is not None:
+            return item[4], item[3]
+        sqlite = self.readers.get()
+        try:
+            req = sqlite.execute(
+                Database.SQL_GET, (zoom, row, col)
+            ).fetchall()
+        finally:
+            self.readers.put(sqlite)
+        return (req[0]["data"], req[0]["hash"]) if req else (False, None)
+
+    def get_area(
+        self, zoom: int, row1: int, col1: int, row2: int, col2: int
+    ) -> dict:
+        """
+        Get all tiles of a rectangular area from database in one query.
 
-        req = self.sqlite.execute(
-            "SELECT data FROM tiles WHERE zoom=? AND row=? AND col=?;",
-            (zoom, row, col)
-        ).fetchall()
-        return req[0]['data'] if req else False
+        Args:
+            zoom (int): tile set zoom level.
+            row1 (int): first tile set row.
+            col1 (int): first tile set column.
+            row2 (int): last tile set row.
+            col2 (int): last tile set column.
+
+        Returns:
+            dict: base64-encoded data and content hash by `(row, col)`.
+        """
+        sqlite = self.readers.get()
+        try:
+            req = sqlite.execute(
+                Database.SQL_GET_AREA, (zoom, row1, row2, col1, col2)
+            ).fetchall()
+        finally:
+            self.readers.put(sqlite)
+        tiles = dict(
+            ((e["row"], e["col"]), (e["data"], e["hash"])) for e in req
+        )
+        for (z, row, col), item in list(self.pending.items()):
+            if z == zoom and row1 <= row <= row2 and col1 <= col <= col2:
+                tiles[(row, col)] = item[4], item[3]
+        return tiles
 
-    def put(self, zoom: int, row: int, col: int, data: str) -> None:
+    def put(self, zoom: int, row: int, col: int, data: str) -> str:
         """
         Set tile data in database with row, column and zoom informations.
+        Tile is written asynchronously by the writer thread but is
+        immediately available from `get`.
 
         Args:
             zoom (int): tile set zoom level.
             row (int): tile set row.
             col (int): tile set column.
             data (str): base64-encoded string.
+
+        Returns:
+            str: content hash.
         """
-        with Database.LOCK:
-            self.sqlite.execute(
-                "INSERT OR REPLACE INTO tiles(zoom, row, col, data) "
-                "VALUES(?,?,?,?);", [zoom, row, col, data]
-            )
-            self.sqlite.commit()
+        key = Database.digest(data)
+        item = [zoom, row, col, key, data]
+        self.pending[(zoom, row, col)] = item
+        self.writes.put(item)
+        return key
 
     def close(self) -> None:
         """
         Save and close database.
         """
-        with Database.LOCK:
-            self.sqlite.commit()
-        self.sqlite.close()
+        Database.OPENED.discard(self)
+        if self.writer.is_alive():
+            self.writes.put(None)
+            self.writer.join()
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+@atexit.register
+def _close_databases() -> None:
+    # writer threads are daemons, queued writes are flushed before exit
+    for database in list(Database.OPENED):
+        database.close()
@@ -2,12 +2,25 @@
 import os
 import math
 import json
+import string
 import tkinter
 import random
 
-from typing import Tuple
+from typing import List, Tuple
 from tkmap import JSON
 
+# fields available in url templates for each tile, all other fields are
+# model attributes substituted once at compilation
+TILE_FIELDS = ("zoom", "row", "col", "q")
+# quadkey digits of 4-bit row and column chunks, indexed by `row << 4 | col`
+QUADS = [
+    "".join(
+        str(((r >> i) & 1) << 1 | ((c >> i) & 1)) for i in range(3, -1, -1)
+    ) for r in range(16) for c in range(16)
+]
+# models loaded from json files by name and options
+REGISTRY = {}
+
 
 class MapModel:
 
@@ -16,37 +29,113 @@ class MapModel:
     tile_h = 256
     a = 6378137.0
     zoom_max = 19
+    # canvas coordinate window size in tiles
+    window = 64
 
     @property
     def tilesize(obj) -> Tuple[int, int]:
         return obj.tile_w, obj.tile_h
 
+    def __setattr__(self, name: str, value) -> None:
+        # public attributes may be substituted in compiled templates or
+        # headers, so changing one drops compilation to redo it lazily
+        object.__setattr__(self, name, value)
+        if not name.startswith("_"):
+            self.__dict__.pop("_templates", None)
+
     def headers(self, *a, **kw) -> dict:
         return {"User-agent": "tkmap/0.1"}
 
+    def compile(self) -> None:
+        """
+        Compile url templates: model attributes are substituted once so only
+        tile fields (`zoom`, `row`, `col` and quadkey `q`) remain to format.
+        Attribute fields may be indexed or dotted (`{subdomains[0]}`).
+        Headers are computed once too. Templates are compiled again when a
+        public attribute is set.
+        """
+        templates = []
+        formatter = string.Formatter()
+        for url in self.urls:
+            template = ""
+            for text, field, spec, conv in formatter.parse(url):
+                template += text.replace("{", "{{").replace("}", "}}")
+                if field is None:
+                    continue
+                root = field.split(".")[0].split("[")[0]
+                if root in TILE_FIELDS:
+                    conv = f"!{conv}" if conv else ""
+                    spec = f":{spec}" if spec else ""
+                    template += "{" + field + conv + spec + "}"
+                elif hasattr(self, root):
+                    value, _ = formatter.get_field(
+                        field, (), {root: getattr(self, root)}
+                    )
+                    value = formatter.convert_field(value, conv)
+                    template += format(value, spec).replace(
+                        "{", "{{"
+                    ).replace("}", "}}")
+                else:
+                    raise Exception(f"unknown field '{field}' in {url}")
+            templates.append(template)
+        self._templates = templates
+        self._quadkey = any("{q" in template for template in templates)
+        self._headers = self.headers()
+
     def get_tile_url(self, row: int, col: int, zoom: int) -> str:
         """Return tile url from row, column and zoom."""
-        return random.choice(self.urls).format(
-            zoom=zoom, col=col, row=row, **self.__dict__
-        ), self.headers()
+        if "_templates" not in self.__dict__:
+            self.compile()
+        return random.choice(self._templates).format(
+            zoom=zoom, col=col, row=row,
+            q=self.Q(row, col, zoom) if self._quadkey else ""
+        ), self._headers
+
+    def get_tile_urls(
+        self, tiles: List[Tuple[int, int, int]]
+    ) -> List[Tuple[str, dict]]:
+        """
+        Return tile urls from a list of row, column and zoom.
+
+        Args:
+            tiles (List[Tuple[int, int, int]]): row, column and zoom of tiles.
+
+        Returns:
+            List[Tuple[str, dict]]: url and headers of tiles.
+        """
+        if "_templates" not in self.__dict__:
+            self.compile()
+        headers, quadkey, Q = self._headers, self._quadkey, self.Q
+        templates = [template.format for template in self._templates]
+        choice = random.choice
+        return [
+            (
+                choice(templates)(
+                    zoom=zoom, col=col, row=row,
+                    q=Q(row, col, zoom) if quadkey else ""
+                ), headers
+            ) for row, col, zoom in tiles
+        ]
 
     def init(self, canvas: tkinter.Canvas, borderwidth: int = 2) -> None:
+        # scrollregion only covers a bounded window of the map, the canvas
+        # keeps the window offset and moves it around the viewport
         n = 2**canvas.zoom
+        w = min(n, self.window)
         canvas.mapsize = n, n
-        canvas["scrollregion"] = 0, 0, n*self.tile_w, n*self.tile_h
+        canvas.windowsize = w*self.tile_w, w*self.tile_h
+        canvas["scrollregion"] = 0, 0, w*self.tile_w, w*self.tile_h
         canvas.borderwidth = borderwidth
         canvas.radius = max(self.tile_h, self.tile_w) * borderwidth
 
     def Q(self, row: int, col: int, zoom: int) -> str:
-        q = "" if zoom != 0 else "0"
-        for i in range(zoom, 0, -1):
-            digit, mask = 0, 1 << (i-1)
-            if (col & mask) != 0:
-                digit += 1
-            if (row & mask) != 0:
-                digit += 2
-            q += str(digit)
-        return q
+        if zoom == 0:
+            return "0"
+        # 4 digits are computed at once from 4-bit row and column chunks
+        return "".join(
+            QUADS[((row >> i) & 15) << 4 | ((col >> i) & 15)]
+            for i in range((zoom - 1) // 4 * 4, -1, -4)
+        )[-zoom:]
 
     def ll2xy(self, lat: float, lon: float, zoom: int) -> Tuple[float, float]:
         n = 2**zoom
@@ -65,10 +154,77 @@ class MapModel:
 
     @staticmethod
     def load(name, **kw):
+        """
+        Load a map model from its json definition. Models are validated,
+        compiled and registered so further loads with the same name and
+        options return the registered model. Registered models are shared:
+        attributes set on one are seen by all its users. Options that are
+        not json serializable bypass the registry.
+        """
+        try:
+            key = (name, json.dumps(kw, sort_keys=True))
+        except TypeError:
+            key = None
+        model = REGISTRY.get(key, None)
+        if model is not None:
+            return model
         model = MapModel()
         with open(os.path.join(JSON, name + ".json"), "r") as in_:
             model.__dict__.update(json.load(in_), **kw)
         if len(getattr(model, "urls", [])):
+            model.compile()
+            if key is not None:
+                REGISTRY[key] = model
             return model
         else:
             raise Exception("no url defined")
+
+
+class LayeredModel(MapModel):
+    """
+    Map model stacking several tile sources (base map, hillshade, labels...).
+    Layer tiles are downloaded in parallel and composited by tile workers off
+    the tkinter thread, so the canvas still draws one item per tile.
+    Composited tiles are cached in a database named after the layer set.
+    Layered models have no tile url of their own, they are only usable
+    through `bio.TileWorker.fetch`.
+
+    Attributes:
+        layers (List[MapModel]): map models from bottom to top.
+        name (str): layer names joined with `+`.
+    """
+
+    def __init__(self, *layers: MapModel) -> None:
+        """
+        Args:
+            *layers (MapModel): map models from bottom to top.
+        """
+        if not len(layers):
+            raise Exception("no layer defined")
+        self.layers = list(layers)
+        self.name = "+".join(layer.name for layer in layers)
+        self.tile_w, self.tile_h = layers[0].tilesize
+        self.zoom_max = min(layer.zoom_max for layer in layers)
+
+    def get_tile_url(self, row: int, col: int, zoom: int) -> str:
+        """Not available, use layer models instead."""
+        raise Exception(
+            f"layered model '{self.name}' has no tile url, use its layers"
+        )
+
+    def get_tile_urls(
+        self, tiles: List[Tuple[int, int, int]]
+    ) -> List[Tuple[str, dict]]:
+        """Not available, use layer models instead."""
+        raise Exception(
+            f"layered model '{self.name}' has no tile url, use its layers"
+        )
+
+    @staticmethod
+    def load(*names, **kw):
+        """
+        Load a layered model from the json definitions of its layers, from
+        bottom to top. Layers are loaded with `MapModel.load` so they are
+        shared with other models using them.
+        """
+        return LayeredModel(*[MapModel.load(name, **kw) for name in names])
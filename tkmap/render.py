@@ -0,0 +1,262 @@
+# -*- coding:utf-8 -*-
+"""
+Headless static map rendering. It stitches tiles into an image file without
+any tkinter window, using the same tile service, workers and database cache
+as `Tkmap` widgets. `Pillow` is required.
+"""
+
+import io
+import os
+import math
+import queue
+import logging
+
+from tkmap import bio, model
+from typing import List, Tuple
+
+try:
+    from PIL import Image
+except Exception:
+    pass
+
+
+def save(image: "Image.Image", path: str) -> None:
+    """
+    Save image, alpha channel is dropped for formats not supporting it.
+
+    Args:
+        image (PIL.Image.Image): image to save.
+        path (str): image file path.
+    """
+    if os.path.splitext(path)[-1].lower() in [".jpg", ".jpeg", ".bmp"]:
+        image = image.convert("RGB")
+    image.save(path)
+
+
+class Renderer:
+    """
+    Static map renderer bound to a map model. Tiles are fetched in parallel
+    by the tile service of the map model so all renderings of a batch share
+    one tile cache and one worker pool.
+
+    ```python
+    >>> from tkmap import model, render
+    >>> with render.Renderer(model.MapModel.load("openstreetmap")) as r:
+    ...     r.render_center((48.645272, 1.841411), 12, (800, 600), "map.png")
+    ```
+
+    Attributes:
+        timeout (int): (class attribute) delay in seconds to wait for a tile.
+        mapmodel (model.MapModel): map model used to generate tile url and
+            compute map coordinates.
+        result (queue.Queue): queue where tile tag and data are pushed into.
+        service (bio.TileService): tile service of the map model.
+    """
+
+    timeout = 30
+
+    def __init__(self, mapmodel: model.MapModel, **options) -> None:
+        """
+        Args:
+            mapmodel (model.MapModel): map tile provider.
+            **options: keyword arguments used to start the tile service if
+                not already running (see `bio.TileService`).
+        """
+        if not bio.PILLOW:
+            raise Exception("PIL is required to render static maps")
+        self.mapmodel = mapmodel
+        self.result = queue.Queue()
+        self.service = bio.TileService.subscribe(
+            mapmodel.name, self.result, **options
+        )
+
+    def __enter__(self) -> "Renderer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        "Leave the tile service."
+        if self.service is not None:
+            self.service.unsubscribe(self.result)
+            self.service = None
+
+    def window(self, job: dict) -> Tuple[int, int, int, int, int]:
+        """
+        Compute map pixel window of a rendering job. Job is defined either
+        by `bbox` as `(lat1, lon1, lat2, lon2)` and `zoom`, or by `center`
+        as `(lat, lon)`, `zoom` and `size` as `(width, height)` in pixels.
+
+        Args:
+            job (dict): rendering job.
+
+        Returns:
+            Tuple[int, int, int, int, int]: zoom level and west, north, east,
+                south map pixel boundaries.
+        """
+        zoom = job["zoom"]
+        if "bbox" in job:
+            lat1, lon1, lat2, lon2 = job["bbox"]
+            w, n = self.mapmodel.ll2xy(
+                max(lat1, lat2), min(lon1, lon2), zoom
+            )
+            e, s = self.mapmodel.ll2xy(
+                min(lat1, lat2), max(lon1, lon2), zoom
+            )
+            return zoom, math.floor(w), math.floor(n), \
+                math.ceil(e), math.ceil(s)
+        # window is snapped to whole pixels so image has the requested size
+        width, height = job["size"]
+        x, y = self.mapmodel.ll2xy(*job["center"], zoom)
+        w, n = math.floor(x - width/2), math.floor(y - height/2)
+        return zoom, w, n, w + width, n + height
+
+    def tags(self, zoom: int, w: int, n: int, e: int, s: int) -> List[str]:
+        """
+        List tile tags covering a map pixel window.
+
+        Returns:
+            List[str]: tile tags with format `{zoom}_{row}_{col}`.
+        """
+        tw, th = self.mapmodel.tilesize
+        size = 2**zoom
+        return [
+            f"{zoom}_{row}_{col}"
+            for row in range(max(0, n//th), min(size, (s-1)//th + 1))
+            for col in range(max(0, w//tw), min(size, (e-1)//tw + 1))
+        ]
+
+    def fetch(self, tags: List[str]) -> dict:
+        """
+        Request tiles to the tile service and wait for them.
+
+        Args:
+            tags (List[str]): tile tags with format `{zoom}_{row}_{col}`.
+
+        Returns:
+            dict: image data by tag, `False` for failed tiles.
+        """
+        tiles = {}
+        waiting = set(tags)
+        for tag in waiting:
+            self.service.request(tag, self.mapmodel, self.result)
+        while len(waiting):
+            try:
+                tag, data, key = self.result.get(timeout=Renderer.timeout)
+            except queue.Empty:
+                logging.error(
+                    f" -> {__class__.__name__}: {len(waiting)} tiles timed out"
+                )
+                self.service.cancel(self.result)
+                break
+            if tag in waiting:
+                waiting.remove(tag)
+                tiles[tag] = data
+        return tiles
+
+    def stitch(
+        self, tiles: dict, zoom: int, w: int, n: int, e: int, s: int
+    ) -> "Image.Image":
+        """
+        Paste tiles into an image covering a map pixel window. Missing tiles
+        are left blank.
+
+        Args:
+            tiles (dict): image data by tag.
+
+        Returns:
+            PIL.Image.Image: rendered image.
+        """
+        tw, th = self.mapmodel.tilesize
+        image = Image.new("RGBA", (e - w, s - n))
+        for tag in self.tags(zoom, w, n, e, s):
+            data = tiles.get(tag, False)
+            if not data:
+                continue
+            _, row, col = [int(i) for i in tag.split("_")]
+            tile = Image.open(io.BytesIO(data)).convert("RGBA")
+            image.paste(tile, (col*tw - w, row*th - n))
+        return image
+
+    def render(self, job: dict) -> "Image.Image":
+        """
+        Render a job (see `Renderer.window`). If job defines a `path`, image
+        is saved in the file.
+
+        Args:
+            job (dict): rendering job.
+
+        Returns:
+            PIL.Image.Image: rendered image.
+        """
+        win = self.window(job)
+        image = self.stitch(self.fetch(self.tags(*win)), *win)
+        if job.get("path", None):
+            save(image, job["path"])
+        return image
+
+    def render_bbox(
+        self, bbox: Tuple[float, float, float, float], zoom: int,
+        path: str = None
+    ) -> "Image.Image":
+        """
+        Render a bounding box.
+
+        Args:
+            bbox (Tuple[float, float, float, float]): two opposite corners
+                as `(lat1, lon1, lat2, lon2)`.
+            zoom (int): zoom level.
+            path (str): image file path.
+
+        Returns:
+            PIL.Image.Image: rendered image.
+        """
+        return self.render({"bbox": bbox, "zoom": zoom, "path": path})
+
+    def render_center(
+        self, center: Tuple[float, float], zoom: int, size: Tuple[int, int],
+        path: str = None
+    ) -> "Image.Image":
+        """
+        Render an image of given size centered on a location.
+
+        Args:
+            center (Tuple[float, float]): latitude and longitude.
+            zoom (int): zoom level.
+            size (Tuple[int, int]): image width and height in pixels.
+            path (str): image file path.
+
+        Returns:
+            PIL.Image.Image: rendered image.
+        """
+        return self.render(
+            {"center": center, "zoom": zoom, "size": size, "path": path}
+        )
+
+    def batch(self, jobs: List[dict], chunk: int = 16) -> List["Image.Image"]:
+        """
+        Render several jobs. Tiles of `chunk` jobs are requested all at once
+        so they are fetched in parallel and shared between jobs. Images of
+        jobs defining a `path` are saved and not returned to spare memory.
+
+        Args:
+            jobs (List[dict]): rendering jobs (see `Renderer.window`).
+            chunk (int): number of jobs fetched together.
+
+        Returns:
+            List[PIL.Image.Image]: rendered images or `None` for saved ones.
+        """
+        images = []
+        for i in range(0, len(jobs), chunk):
+            windows = [self.window(job) for job in jobs[i:i+chunk]]
+            tiles = self.fetch(
+                list(set(tag for win in windows for tag in self.tags(*win)))
+            )
+            for job, win in zip(jobs[i:i+chunk], windows):
+                image = self.stitch(tiles, *win)
+                if job.get("path", None):
+                    save(image, job["path"])
+                    image = None
+                images.append(image)
+        return images
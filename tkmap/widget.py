@@ -9,6 +9,7 @@ import json
 import queue
 import tkinter
 import logging
+import fractions
 import functools
 
 from tkmap import JSON, load_img_package, bio, model
@@ -19,7 +20,8 @@ from tkinter import ttk
 class Tile:
     """
     `Tile` class to leverage the tcl interpreter to perform fast image
-    operation on canvas.
+    operation on canvas. Tcl images are named after tile content hash so
+    canvas items showing identical tiles share the same image.
 
     Attributes:
         TILE_CMD_CREATE (str): (class attribute) tcl command pattern to create
@@ -29,23 +31,26 @@ class Tile:
         TILE_CMD_HIDE (str): (class attribute) tcl command pattern to hide the
             image canvas item.
         TILE_CMD_CLEAR (str): (class attribute) tcl command pattern to delete
-            the image data.
+            the image canvas item.
         tkeval (callable): (class attribute) the tk `eval` command.
         tkcall (callable): (class attribute) the tk `call` command.
+        images (dict): (class attribute) reference count of tcl images.
         w_name (str): master canvas name.
+        tag (str): tile tag.
     """
 
     TILE_CMD_CREATE = \
         "if {[%(w)s find withtag %(t)s] eq {}} { " +\
         "%(w)s lower [%(w)s create image " +\
-        "[expr {%(c)s * [image width %(n)s]}] " +\
-        "[expr {%(r)s * [image height  %(n)s]}] " +\
-        "-anchor nw -image %(n)s -tags {%(t)s tile} -state hidden] }"
+        "[expr {%(c)s * [image width %(n)s] - %(x)s}] " +\
+        "[expr {%(r)s * [image height  %(n)s] - %(y)s}] " +\
+        "-anchor nw -image %(n)s -tags {%(t)s z%(z)s tile} -state hidden] }"
     TILE_CMD_SHOW = "%(w)s itemconfig %(t)s -state normal; update"
     TILE_CMD_HIDE = "%(w)s itemconfig %(t)s -state hidden"
-    TILE_CMD_CLEAR = "%(w)s delete %(t)s; image delete %(t)s"
+    TILE_CMD_CLEAR = "%(w)s delete %(t)s"
     tkeval = None
     tkcall = None
+    images = {}
 
     def __init__(self, master: tkinter.Canvas) -> None:
         """
@@ -59,41 +64,77 @@ class Tile:
             Tile.tkcall = master.tk.call
         self.w_name = master._w
 
-    def create(self, tag: str, data: str) -> None:
+    @staticmethod
+    def release(*names: str) -> List[str]:
+        """
+        Decrease reference count of tcl images.
+
+        Args:
+            *names (str): tcl image names.
+
+        Returns:
+            List[str]: tcl image names no more used by any canvas item.
+        """
+        unused = []
+        for name in names:
+            count = Tile.images.get(name, 1) - 1
+            if count > 0:
+                Tile.images[name] = count
+            else:
+                Tile.images.pop(name, None)
+                unused.append(name)
+        return unused
+
+    def create(
+        self, tag: str, data: bytes, key: str = None,
+        origin: Tuple[int, int] = (0, 0)
+    ) -> None:
         """
-        Create the image data inside tcl interpreter and generate the
-        associated canvas image-item.
+        Create the image data inside tcl interpreter, or reuse the one with
+        the same content hash, and generate the associated canvas image-item.
 
         Args:
             tag (str): tile tag with format `{zoom}_{row}_{col}`.
-            data (str): image data as string.
+            data (bytes): image data, passed to tcl as a byte array.
+            key (str): tile content hash.
+            origin (Tuple[int, int]): map pixel coordinates of canvas origin
+                at tile zoom level.
         """
-        imgtk = \
-            Tile.tkcall("image", "create", "photo", tag, "-data", data)
-        _, row, col = tag.split("_")
-        args = {"w": self.w_name, "n": imgtk, "r": row, "c": col, "t": tag}
+        imgtk = f"img_{key or tag}"
+        if imgtk not in Tile.images:
+            Tile.tkcall("image", "create", "photo", imgtk, "-data", data)
+        Tile.images[imgtk] = Tile.images.get(imgtk, 0) + 1
+        zoom, row, col = tag.split("_")
+        args = {
+            "w": self.w_name, "n": imgtk, "r": row, "c": col, "t": tag,
+            "z": zoom, "x": origin[0], "y": origin[1]
+        }
         Tile.tkeval(Tile.TILE_CMD_CREATE % args)
         self._clear = Tile.TILE_CMD_CLEAR % args
         self._hide = Tile.TILE_CMD_HIDE % args
         self._show = Tile.TILE_CMD_SHOW % args
         self._imgtk = imgtk
+        self.tag = tag
 
     def show(self) -> None:
         "Reveal the image item on the canvas."
-        logging.info(f" -> {__class__.__name__} {self._imgtk} show")
+        logging.info(f" -> {__class__.__name__} {self.tag} show")
         Tile.tkeval(self._show)
 
     def hide(self) -> None:
         "Hide the image item from the canvas."
-        logging.info(f" -> {__class__.__name__} {self._imgtk} hidden")
+        logging.info(f" -> {__class__.__name__} {self.tag} hidden")
         Tile.tkeval(self._hide)
 
     def clear(self) -> None:
         """
-        Delete the image item from canvas and image data from tcl interpreter.
+        Delete the image item from canvas and image data from tcl interpreter
+        if no other item uses it.
         """
-        logging.info(f" -> {__class__.__name__} {self._imgtk} cleared")
+        logging.info(f" -> {__class__.__name__} {self.tag} cleared")
         Tile.tkeval(self._clear)
+        for name in Tile.release(self._imgtk):
+            Tile.tkcall("image", "delete", name)
 
 
 def _xscroll(a, b, widget):
@@ -129,6 +170,7 @@ def _drift(obj: tkinter.Canvas, speed_x: float, speed_y: float) -> None:
             f"{obj._w} xview scroll {int(round(dx))} units;"
             f"{obj._w} yview scroll {int(round(dy))} units"
         )
+        obj._bbox = None
         obj._after_tasks.append(
             obj.after(
                 int(10 - (time.time() - t)*1000),
@@ -152,12 +194,9 @@ def _drawloop(obj: tkinter.Canvas, ms: int) -> None:
     # _update canvas with queued tiles
     while not obj.DONE.empty():
         try:
-            tag, data = obj.DONE.get()
+            tag, data, key = obj.DONE.get()
             if data:
-                tile = Tile(obj)
-                tile.create(tag, data)
-                tile.show()
-                obj.cache[tag] = tile
+                obj._create_tile(tag, data, key).show()
             with obj.QUEUED.mutex:
                 if tag in obj.QUEUED.queue:
                     obj.QUEUED.queue.remove(tag)
@@ -166,6 +205,20 @@ def _drawloop(obj: tkinter.Canvas, ms: int) -> None:
                 f" -> _drawloop error: {error} - tag {tag}",
                 exc_info=getattr(obj, "exc_info", False)
             )
+    # measure time to first full frame, failed tiles leave holes so the frame
+    # is full once every tile of the draw area is created
+    if obj._t_open is not None and obj.metrics["first_full_frame"] is None \
+       and obj._drawarea == obj.drawarea and not len(obj.QUEUED.queue) \
+       and obj._is_full():
+        obj.metrics["first_full_frame"] = time.time() - obj._t_open
+        obj._t_open = None
+        logging.info(
+            f" -> first full frame in {obj.metrics['first_full_frame']:.3f}s"
+        )
+    # remove zoom preview once new zoom level is fully drawn
+    if len(obj._preview_images) and obj._gesture is None and \
+       obj._drawarea == obj.drawarea and not len(obj.QUEUED.queue):
+        obj._clear_preview()
     # clean _after_tasks list
     for callback in obj._after_tasks[:]:
         # if task info unavailable (it raises TclError) then it is running or
@@ -185,28 +238,73 @@ class Tkmap(tkinter.Canvas):
         coords (tkinter.Label): widget to display map coordinates.
         framerate (int): rate of canvas update.
         cachesize (int): number of tile stored in Tkmap cache.
+        inputrate (int): maximum rate of mouse motion processing, motion
+            events received meanwhile are merged. Set to 0 to process every
+            event.
+        zoom_settle (int): delay in milliseconds without wheel event before
+            zoom gesture is committed and tiles are requested.
+        wheel_unit (int): mouse wheel delta corresponding to one zoom level,
+            smaller deltas (trackpads) give fractional zoom steps.
+        decode (str): tile decode stage mode, `"thread"`, `"process"` or
+            `None` (see `bio.TileWorker`).
+        warmstart (bool): if `True`, tiles of the starting viewport found in
+            database are loaded before the first frame.
+        metrics (dict): performance metrics, `first_full_frame` is the
+            delay in seconds between map opening, or widget mapping if it
+            occurs later, and the first frame with all visible tiles drawn.
         cache (dict): tile cache.
         mapmodel (model.MapMode): map model used to generate tile url and
             compute map coordinates.
-        workers (List[bio.TileWorker]): List of python thread used to perform
-            tile downloads or database queries.
+        service (bio.TileService): process-wide tile service shared with
+            other widgets using the same map model.
+        origins (dict): map pixel coordinates of canvas origin by zoom level.
+            Canvas only covers a bounded window of the map that follows the
+            viewport, so canvas coordinates stay small at any zoom level.
+        PREVIEW_CMD (str): (class attribute) tcl command pattern to create
+            scaled copies of tiles during a zoom gesture. Items deleted from
+            cache meanwhile are skipped.
     """
 
+    PREVIEW_CMD = \
+        "set images {}; foreach id {%(ids)s} { " +\
+        "if {[%(cv)s type $id] eq {}} continue; " +\
+        "set src [%(cv)s itemcget $id -image]; " +\
+        "lassign [%(cv)s coords $id] x y; " +\
+        "set x [expr {%(x)s + ($x - %(x)s) * %(k)s}]; " +\
+        "set y [expr {%(y)s + ($y - %(y)s) * %(k)s}]; " +\
+        "if {$x > %(e)s || $y > %(s)s || " +\
+        "$x + [image width $src] * %(k)s < %(w)s || " +\
+        "$y + [image height $src] * %(k)s < %(n)s} continue; " +\
+        "set img [image create photo]; " +\
+        "$img copy $src -zoom %(zoom)s -subsample %(subsample)s; " +\
+        "%(cv)s create image $x $y -anchor nw -image $img -tags preview; " +\
+        "lappend images $img }; set images"
+
     @property
     def bbox(obj) -> tuple:
-        "Returns west, north, east and south boundaries view on canvas area."
-        return [
-            int(float(e)) for e in obj.tk.eval(
-                f"list [{obj._w} canvasx 0] [{obj._w} canvasy 0]"
-                f" [{obj._w} canvasx [expr [winfo width {obj._w}]]]"
-                f" [{obj._w} canvasy [expr [winfo height {obj._w}]]]"
-            ).split()
-        ]
+        """
+        Returns west, north, east and south boundaries view on canvas area.
+        Value is cached until the view changes.
+        """
+        if obj._bbox is None:
+            obj._bbox = [
+                int(float(e)) for e in obj.tk.eval(
+                    f"list [{obj._w} canvasx 0] [{obj._w} canvasy 0]"
+                    f" [{obj._w} canvasx [expr [winfo width {obj._w}]]]"
+                    f" [{obj._w} canvasy [expr [winfo height {obj._w}]]]"
+                ).split()
+            ]
+        return obj._bbox
 
     def __init__(self, master=None, cnf={}, **kw) -> None:
         self.framerate = kw.pop("framerate", 4)
         self.cachesize = kw.pop("cachesize", 500)
+        self.zoom_settle = kw.pop("zoom_settle", 250)
+        self.inputrate = kw.pop("inputrate", 60)
+        self.wheel_unit = kw.pop("wheel_unit", 120)
         self.exc_info = kw.pop("exc_info", False)
+        self.decode = kw.pop("decode", None)
+        self.warmstart = kw.pop("warmstart", False)
 
         tkinter.Canvas.__init__(self, master, cnf, **kw)
         # scrollincrement needs to be set to pixel size for correct drift
@@ -227,22 +325,34 @@ class Tkmap(tkinter.Canvas):
 
         load_img_package(self.tk)
 
-        self.JOB = queue.LifoQueue()
         self.DONE = queue.LifoQueue()
         self.QUEUED = queue.Queue()
 
         self.cache: Cache = Cache(size=self.cachesize)
         self.mapmodel: model.MapModel = None
-        self.workers: List[bio.TileWorker] = []
+        self.service: bio.TileService = None
         self.latlon: List[float] = [0.0, 0.0]
+        self.origins: dict = {}
+        self.metrics: dict = {"first_full_frame": None}
 
         self._drawarea = ()
         self._after_tasks = []
+        self._t_open = None
+        self._gesture = None
+        self._preview_images = []
+        self._bbox = None
+        self._pointer = None
+        self._drag = None
+        self._input_task = None
+        # tcl command registered once, so scheduling input processing costs
+        # a single `after` call
+        self._input_cmd = self.register(self._process_input)
         self._tps = [None, 0., 0., 0., 0.]
 
         self.borderwidth = 0
         self.drawarea = ()
         self.mapsize = 1, 1
+        self.windowsize = 1, 1
         self.radius = 0
         self.zoom = 0
 
@@ -258,6 +368,40 @@ class Tkmap(tkinter.Canvas):
         getattr(self, f"_{widget}_place").update(cnf, **kw)
         getattr(self, widget).place(**self._coords_place)
 
+    @property
+    def origin(obj) -> Tuple[int, int]:
+        "Returns map pixel coordinates of canvas origin at current zoom."
+        return obj.origins.get(obj.zoom, (0, 0))
+
+    def ll2xy(self, lat: float, lon: float) -> Tuple[float, float]:
+        """
+        Convert latitude and longitude into canvas coordinates.
+
+        Args:
+            lat (float): latitude in degrees.
+            lon (float): longitude in degrees.
+
+        Returns:
+            Tuple[float, float]: canvas coordinates.
+        """
+        x, y = self.mapmodel.ll2xy(lat, lon, self.zoom)
+        ox, oy = self.origin
+        return x - ox, y - oy
+
+    def xy2ll(self, x: float, y: float) -> Tuple[float, float]:
+        """
+        Convert canvas coordinates into latitude and longitude.
+
+        Args:
+            x (float): horizontal canvas coordinates.
+            y (float): vertical canvas coordinates.
+
+        Returns:
+            Tuple[float, float]: latitude and longitude in degrees.
+        """
+        ox, oy = self.origin
+        return self.mapmodel.xy2ll(x + ox, y + oy, self.zoom)
+
     def dump_location(self) -> None:
         "Drops cursor location into filesystem"
         if self.mapmodel is not None:
@@ -274,10 +418,9 @@ class Tkmap(tkinter.Canvas):
             y (float): vertical pixel coordinates.
         """
         self.latlon = list(
-            self.mapmodel.xy2ll(
+            self.xy2ll(
                 self.canvasx(x or self.winfo_width()/2),
-                self.canvasy(y or self.winfo_height()/2),
-                self.zoom
+                self.canvasy(y or self.winfo_height()/2)
             )
         )
 
@@ -305,6 +448,10 @@ class Tkmap(tkinter.Canvas):
                 location.
         """
         self.close()
+        # measure starts once the widget is mapped, before that the draw
+        # area does not match the real viewport
+        self._t_open = time.time() if self.winfo_ismapped() else None
+        self.metrics["first_full_frame"] = None
         data = self.load_location()
         self.zoom = zoom or data.get("zoom", 0)
         self.latlon = location or data.get("latlon", [0., 0.])
@@ -323,8 +470,11 @@ class Tkmap(tkinter.Canvas):
         self.coords.place_forget()
         self._stop()
         self._drawarea = ()
+        self._gesture = None
+        self._clear_preview()
         self.cache.clear()
         self.dump_location()
+        self.origins.clear()
         self.mapmodel = None
 
     def center(self, px: float = None, py: float = None) -> None:
@@ -335,15 +485,16 @@ class Tkmap(tkinter.Canvas):
             px (float): horizontal pixel coordinates.
             py (float): vertical pixel coordinates.
         """
-        x1, y1, x2, y2 = [int(e) for e in self["scrollregion"].split()]
-        width, height = x2 - x1, y2 - y1
-        x, y = self.mapmodel.ll2xy(*self.latlon, zoom=self.zoom)
+        width, height = self.windowsize
+        self._move_window(*self.mapmodel.ll2xy(*self.latlon, zoom=self.zoom))
+        x, y = self.ll2xy(*self.latlon)
         self.xview_moveto(
             (width * x/width - (px or self.winfo_width()/2)) / width
         )
         self.yview_moveto(
             (height * y/height - (py or self.winfo_height()/2)) / height
         )
+        self._bbox = None
 
     def destroy(self) -> None:
         self.close()
@@ -356,6 +507,16 @@ class Tkmap(tkinter.Canvas):
             except tkinter.TclError:
                 pass
         self._after_tasks.clear()
+        # pending coalesced input is dropped with its task so next open can
+        # schedule input processing again
+        if self._input_task is not None:
+            try:
+                self.tk.call("after", "cancel", self._input_task)
+            except tkinter.TclError:
+                pass
+        self._input_task = None
+        self._drag = None
+        self._pointer = None
 
     def _start(self) -> None:
         self.bind("<Button-1>", self.on_button_1)
@@ -363,18 +524,56 @@ class Tkmap(tkinter.Canvas):
         self.bind("<Motion>", self.on_motion)
         self.bind("<ButtonRelease-1>", self.on_button_1_release)
         self.bind("<MouseWheel>", self.on_mouse_wheel)
-        self.bind("<Configure>", lambda e: self._update_drawarea())
+        self.bind("<Configure>", lambda e: self.on_configure())
+        self.bind("<Map>", lambda e: self.on_map())
         self.bind(
             "<Control-B1-Motion>", lambda e: self.on_button_1_motion(e, 5)
         )
-        self.workers = [
-            bio.TileWorker(self.JOB, self.DONE, self.mapmodel.name),
-            bio.TileWorker(self.JOB, self.DONE, self.mapmodel.name)
-        ]
+        self.service = bio.TileService.subscribe(
+            self.mapmodel.name, self.DONE,
+            exc_info=self.exc_info, decode=self.decode
+        )
+        if self.warmstart:
+            self._warmstart()
         self._drawarea = -1, -1, -1, -1
         self._update_drawarea()
         _drawloop(self, 1000//self.framerate)
 
+    def _warmstart(self) -> None:
+        # load tiles around saved location from database in one query, the
+        # widget may not be mapped yet so requested size is used as fallback
+        tw, th = self.mapmodel.tilesize
+        nc, nr = self.mapsize
+        x, y = self.mapmodel.ll2xy(*self.latlon, zoom=self.zoom)
+        w = max(self.winfo_width(), self.winfo_reqwidth())/2 + self.radius
+        h = max(self.winfo_height(), self.winfo_reqheight())/2 + self.radius
+        for tag, data, key in self.service.preload(
+            self.zoom,
+            max(0, int(y - h)//th), max(0, int(x - w)//tw),
+            min(nr - 1, int(y + h)//th), min(nc - 1, int(x + w)//tw)
+        ):
+            if tag not in self.cache:
+                # unreadable tiles are left to the workers
+                try:
+                    self._create_tile(tag, data, key)
+                except tkinter.TclError as error:
+                    logging.error(f" -> _warmstart error: {error} - tag {tag}")
+
+    def _create_tile(self, tag: str, data: bytes, key: str) -> Tile:
+        tile = Tile(self)
+        tile.create(
+            tag, data, key, self.origins.get(int(tag.split("_")[0]), (0, 0))
+        )
+        self.cache[tag] = tile
+        return tile
+
+    def _is_full(self) -> bool:
+        c1, r1, c2, r2 = self.drawarea
+        return all(
+            f"{self.zoom}_{r}_{c}" in self.cache
+            for r in range(r1, r2) for c in range(c1, c2)
+        )
+
     def _stop(self) -> None:
         self._cancel_tasks()
         self.unbind("<Button-1>")
@@ -383,21 +582,58 @@ class Tkmap(tkinter.Canvas):
         self.unbind("<ButtonRelease-1>")
         self.unbind("<MouseWheel>")
         self.unbind("<Configure>")
+        self.unbind("<Map>")
         self.unbind("<Control-B1-Motion>")
         self._clear_queues()
-        while len(self.workers):
-            worker = self.workers.pop(0)
-            worker.kill()
+        if self.service is not None:
+            self.service.unsubscribe(self.DONE)
+            self.service = None
 
-    def _update_drawarea(self) -> None:
+    def _move_window(self, x: float, y: float) -> Tuple[int, int]:
+        # center the canvas window on map pixel coordinates and move the tiles
+        # of current zoom level accordingly
+        tw, th = self.mapmodel.tilesize
+        nc, nr = self.mapsize
+        width, height = self.windowsize
+        ox = min(max(0, int(x - width/2) // tw * tw), nc*tw - width)
+        oy = min(max(0, int(y - height/2) // th * th), nr*th - height)
+        ox0, oy0 = self.origin
+        dx, dy = ox - ox0, oy - oy0
+        if dx or dy:
+            self.origins[self.zoom] = ox, oy
+            self.move(f"z{self.zoom}", -dx, -dy)
+        return dx, dy
+
+    def _recenter(self) -> bool:
+        # move the canvas window if viewport is getting close to its edges
+        width, height = self.windowsize
+        margin = self.radius + max(self.mapmodel.tilesize)
+        w, n, e, s = self.bbox
+        if w > margin and n > margin and \
+           e < width - margin and s < height - margin:
+            return False
+        ox, oy = self.origin
+        dx, dy = self._move_window(ox + (w+e)/2, oy + (n+s)/2)
+        if dx or dy:
+            self.xview_moveto((w - dx) / width)
+            self.yview_moveto((n - dy) / height)
+            self._bbox = None
+            return True
+        return False
+
+    def _update_drawarea(self) -> bool:
+        recentered = self._recenter()
         tw, th = self.mapmodel.tilesize
         nr, nc = self.mapsize
         bd = self.borderwidth
+        ox, oy = self.origin
         w, n, e, s = self.bbox
+        w, n, e, s = w + ox, n + oy, e + ox, s + oy
         self.drawarea = (
             max(0, w//tw-bd), max(0, n//th-bd),
             min(nr, e//tw+bd), min(nc, s//th+bd)
         )
+        return recentered
 
     def _update(self) -> None:
         c1, r1, c2, r2 = self.drawarea
@@ -420,9 +656,12 @@ class Tkmap(tkinter.Canvas):
         for tag in tags_to_show - cached_tiles:
             if tag not in self.QUEUED.queue:
                 self.QUEUED.put(tag)
-                self.JOB.put([tag, self.mapmodel])
+                self.service.request(tag, self.mapmodel, self.DONE)
 
-        all_tiles = cmd(f"{_w} find overlapping {self['scrollregion']}")
+        all_tiles = cmd(
+            f"{_w} find overlapping 0 0 {self.windowsize[0]} "
+            f"{self.windowsize[1]}"
+        )
         tile_to_show = \
             cmd(f"{_w} find overlapping {w - r} {n - r} {e + r} {s + r}")
         tile_to_hide = set(all_tiles.split()) - set(tile_to_show.split())
@@ -444,10 +683,10 @@ class Tkmap(tkinter.Canvas):
             )
 
     def _clear_queues(self) -> None:
+        if self.service is not None:
+            self.service.cancel(self.DONE)
         with self.DONE.mutex:
             self.DONE.queue.clear()
-        with self.JOB.mutex:
-            self.JOB.queue.clear()
         with self.QUEUED.mutex:
             self.QUEUED.queue.clear()
 
@@ -456,15 +695,21 @@ class Tkmap(tkinter.Canvas):
         self.tk.call(self._w, 'scan', 'mark', event.x, event.y)
         self._tps = [time.time(), event.x, event.y, 0., 0.]
 
+    def on_configure(self) -> None:
+        self._bbox = None
+        self._update_drawarea()
+
+    def on_map(self) -> None:
+        if self._t_open is None and self.metrics["first_full_frame"] is None:
+            self._t_open = time.time()
+
     def on_motion(self, event: tkinter.Event) -> None:
-        lat, lon = self.mapmodel.xy2ll(
-            self.canvasx(event.x), self.canvasy(event.y), self.zoom
-        )
-        self.tk.setvar("coords", f"lat {lat:3.5f}° | lon {lon:3.5f}°")
+        self._pointer = event.x, event.y
+        self._schedule_input()
 
     def on_button_1_motion(self, event: tkinter.Event, gain: int = 1) -> None:
-        self.tk.call(self._w, 'scan', 'dragto', event.x, event.y, gain)
-        self._update_drawarea()
+        self._drag = event.x, event.y, gain
+        self._schedule_input()
         # speed cursor computation
         t, x, y = time.time(), event.x, event.y
         dt = t - self._tps[0]
@@ -473,8 +718,42 @@ class Tkmap(tkinter.Canvas):
             self._tps[-1] = (y - self._tps[2]) / dt
             self._tps[:3] = [t, x, y]
 
+    def _schedule_input(self) -> None:
+        # motion events are merged and processed at most once per frame
+        if self.inputrate <= 0:
+            self._process_input()
+        elif self._input_task is None:
+            # input task is not listed in `_after_tasks`, it is tracked by
+            # `_input_task` so drawloop does not poll it
+            self._input_task = self.tk.call(
+                "after", 1000 // self.inputrate, self._input_cmd
+            )
+
+    def _process_input(self) -> None:
+        self._input_task = None
+        if self._drag is not None:
+            x, y, gain = self._drag
+            self._drag = None
+            self.tk.call(self._w, 'scan', 'dragto', x, y, gain)
+            self._bbox = None
+            # scan mark is reset when the canvas window moved under the
+            # pointer
+            if self._update_drawarea():
+                self.tk.call(self._w, 'scan', 'mark', x, y)
+        if self._pointer is not None:
+            x, y = self._pointer
+            self._pointer = None
+            # canvasx and canvasy computed from cached view boundaries
+            w, n, e, s = self.bbox
+            lat, lon = self.xy2ll(w + x, n + y)
+            self.tk.setvar("coords", f"lat {lat:3.5f}° | lon {lon:3.5f}°")
+
     def on_button_1_release(self, event: tkinter.Event) -> None:
         self.configure(cursor="arrow")
+        # pending input is processed now and its task cancelled
+        if self._input_task is not None:
+            self.tk.call("after", "cancel", self._input_task)
+        self._process_input()
         self.save_coords()
         if self._tps[0]:
             self._tps[0] = None
@@ -484,18 +763,104 @@ class Tkmap(tkinter.Canvas):
 
     def on_mouse_wheel(self, event: tkinter.Event) -> None:
         zoom_max = getattr(self.mapmodel, "zoom_max", 17)
-        delta = 1 if event.num == 4 or event.delta == 120 else -1
-        zoom = min(max(0, self.zoom + delta), zoom_max)
-        if zoom == self.zoom:
+        if event.num in (4, 5):
+            delta = 1 if event.num == 4 else -1
+        else:
+            delta = max(-1., min(1., event.delta / self.wheel_unit))
+        # a gesture gathers wheel events until they settle, meanwhile
+        # visible tiles are scaled and no tile is requested
+        if self._gesture is None:
+            self._clear_preview()
+            _w, zoom = self._w, self.zoom
+            w, n, e, s = self.bbox
+            self._gesture = {
+                "level": float(zoom), "step": 0, "task": None,
+                "anchor": (
+                    event.x, event.y,
+                    self.canvasx(event.x), self.canvasy(event.y)
+                ),
+                "ids": self.tk.eval(
+                    "set ids {}; "
+                    f"foreach id [{_w} find overlapping {w} {n} {e} {s}] {{ "
+                    f"if {{\"z{zoom}\" in [{_w} gettags $id] && "
+                    f"[{_w} itemcget $id -state] eq \"normal\"}} "
+                    "{lappend ids $id} }; set ids"
+                )
+            }
+        gesture = self._gesture
+        gesture["level"] = min(max(0., gesture["level"] + delta), zoom_max)
+        # preview follows the level by quarter steps, it is limited to 2x
+        # magnification to spare memory
+        step = max(-3, min(1, round((gesture["level"] - self.zoom) * 4) / 4))
+        if step != gesture["step"]:
+            gesture["step"] = step
+            self._preview(gesture, step)
+        if gesture["task"] is not None:
+            self.after_cancel(gesture["task"])
+        gesture["task"] = self.after(self.zoom_settle, self._commit_zoom)
+        self._after_tasks.append(gesture["task"])
+
+    def _preview(self, gesture: dict, step: float) -> None:
+        # replace gesture tiles by copies scaled by 2**step around anchor,
+        # tk photo copy scales by rational zoom/subsample factors
+        self._clear_preview()
+        ids = gesture["ids"]
+        if step == 0:
+            self.tk.eval(
+                "foreach id {" + ids + "} "
+                "{" + self._w + " itemconfig $id -state normal}"
+            )
             return
+        _, _, x, y = gesture["anchor"]
+        w, n, e, s = self.bbox
+        k = fractions.Fraction(2.**step).limit_denominator(8)
+        self._preview_images = list(
+            self.tk.splitlist(
+                self.tk.eval(
+                    Tkmap.PREVIEW_CMD % {
+                        "cv": self._w, "ids": ids, "x": x, "y": y,
+                        "k": float(k), "w": w, "n": n, "e": e, "s": s,
+                        "zoom": k.numerator, "subsample": k.denominator
+                    }
+                )
+            )
+        )
+        self.tk.eval(
+            "foreach id {" + ids + "} "
+            "{" + self._w + " itemconfig $id -state hidden}"
+        )
 
-        self.save_coords(event.x, event.y)
-        self.zoom = zoom
+    def _clear_preview(self) -> None:
+        self.delete("preview")
+        if len(self._preview_images):
+            self.tk.call("image", "delete", *self._preview_images)
+            self._preview_images = []
 
-        self._clear_queues()
-        self.cache.hide()
-        self.mapmodel.init(self)
-        self.center(event.x, event.y)
+    def _commit_zoom(self) -> None:
+        gesture, self._gesture = self._gesture, None
+        if gesture is None:
+            return
+        ex, ey, cx, cy = gesture["anchor"]
+        zoom = round(gesture["level"])
+        # preview is scaled to the committed level, or removed beyond its
+        # limits
+        step = zoom - self.zoom
+        if step != gesture["step"]:
+            if -3 <= step <= 1:
+                self._preview(gesture, step)
+            else:
+                self._clear_preview()
+        if zoom != self.zoom:
+            self.save_coords(ex, ey)
+            self.zoom = zoom
+            self._clear_queues()
+            self.cache.hide()
+            self.mapmodel.init(self)
+            self.center(ex, ey)
+            # preview stays under the anchor until new tiles are drawn
+            self.move(
+                "preview", self.canvasx(ex) - cx, self.canvasy(ey) - cy
+            )
         self._drawarea = ()
         self._update_drawarea()
 
@@ -505,7 +870,7 @@ class Cache(dict):
     HIDE_ALL = \
         "foreach tag {%(tags)s} {%(widget)s itemconfig $tag -state hidden};"
     DELETE_ALL = \
-        'image delete %(tags)s; %(widget)s delete "all";'
+        'image delete %(images)s; %(widget)s delete "all";'
 
     def __init__(self, *args, **kwargs) -> None:
         self.size = kwargs.pop("size", -1)
@@ -520,10 +885,10 @@ class Cache(dict):
             while not popped and i < len(self):
                 tile = self[self.store[i]]
                 if tile.tkeval(
-                    f"{tile.w_name} itemcget {tile._imgtk} -state"
+                    f"{tile.w_name} itemcget {tile.tag} -state"
                 ) == 'hidden':
                     logging.info(
-                        f" -> {__class__.__name__} {tile._imgtk} popped"
+                        f" -> {__class__.__name__} {tile.tag} popped"
                     )
                     self.pop(self.store[i]).clear()
                     popped = True
@@ -541,9 +906,10 @@ class Cache(dict):
     def clear(self) -> None:
         if len(self.store):
             tile0 = self[self.store[0]]
+            images = Tile.release(*(tile._imgtk for tile in self.values()))
             tile0.tkeval(
                 Cache.DELETE_ALL %
-                {"tags": " ".join(self.keys()), "widget": tile0.w_name}
+                {"images": " ".join(images), "widget": tile0.w_name}
             )
             self.store.clear()
         dict.clear(self)